@@ -15,6 +15,7 @@ import hashlib
 import os
 import shutil
 import tempfile
+from contextlib import contextmanager
 from io import BytesIO
 
 import pytest
@@ -29,13 +30,17 @@ from invenio_db import InvenioDB
 from invenio_db import db as db_
 from invenio_db.utils import drop_alembic_version_table
 from invenio_i18n import Babel, InvenioI18N
+from sqlalchemy import event
+from sqlalchemy.engine.url import make_url
 from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import scoped_session, sessionmaker
 from sqlalchemy.schema import DropConstraint, DropSequence, DropTable
 from sqlalchemy_utils.functions import create_database, database_exists
 
 from invenio_files_rest import InvenioFilesREST
 from invenio_files_rest.models import (
     Bucket,
+    FileInstance,
     Location,
     MultipartObject,
     ObjectVersion,
@@ -73,7 +78,17 @@ def _compile_drop_sequence(element, compiler, **kwargs):
     return compiler.visit_drop_sequence(element) + " CASCADE"
 
 
-@pytest.fixture()
+def _worker_database_uri(uri):
+    # Give every pytest-xdist worker its own database.
+    worker = os.environ.get("PYTEST_XDIST_WORKER")
+    url = make_url(uri)
+    if not worker or url.database in (None, "", ":memory:"):
+        return uri
+    url = url.set(database="{0}_{1}".format(url.database, worker))
+    return url.render_as_string(hide_password=False)
+
+
+@pytest.fixture(scope="module")
 def base_app():
     """Flask application fixture."""
     app_ = Flask("testapp")
@@ -86,8 +101,8 @@ def base_app():
         CELERY_TASK_ALWAYS_EAGER=True,
         CELERY_TASK_EAGER_PROPAGATES=True,
         SQLALCHEMY_TRACK_MODIFICATIONS=True,
-        SQLALCHEMY_DATABASE_URI=os.environ.get(
-            "SQLALCHEMY_DATABASE_URI", "sqlite:///:memory:"
+        SQLALCHEMY_DATABASE_URI=_worker_database_uri(
+            os.environ.get("SQLALCHEMY_DATABASE_URI", "sqlite:///:memory:")
         ),
         WTF_CSRF_ENABLED=False,
         SERVER_NAME="invenio.org",
@@ -110,29 +125,70 @@ def base_app():
     return app_
 
 
-@pytest.yield_fixture()
-def app(base_app):
-    """Flask application fixture."""
+@pytest.fixture(scope="module")
+def module_app(base_app):
+    """Flask application fixture shared by all tests in a module."""
     InvenioI18N(base_app)
     InvenioAccounts(base_app)
     InvenioAccess(base_app)
     InvenioFilesREST(base_app)
     base_app.register_blueprint(blueprint)
-
-    with base_app.app_context():
-        yield base_app
+    return base_app
 
 
 @pytest.yield_fixture()
-def db(app):
-    """Get setup database."""
-    if not database_exists(str(db_.engine.url)):
-        create_database(str(db_.engine.url))
-    db_.create_all()
+def app(module_app):
+    """Flask application fixture."""
+    with module_app.app_context():
+        yield module_app
+
+
+@pytest.yield_fixture(scope="module")
+def database(module_app):
+    """Create the database schema once per test module."""
+    with module_app.app_context():
+        if not database_exists(str(db_.engine.url)):
+            create_database(str(db_.engine.url))
+        db_.create_all()
+
     yield db_
-    db_.session.remove()
-    db_.drop_all()
-    drop_alembic_version_table()
+
+    with module_app.app_context():
+        db_.session.remove()
+        db_.drop_all()
+        drop_alembic_version_table()
+
+
+@pytest.yield_fixture()
+def db(app, database):
+    """Get setup database.
+
+    Each test runs inside a SAVEPOINT on an outer transaction which is rolled
+    back afterwards, so the schema only has to be created once per module.
+    Instances are not expired on commit; tests that need to see changes made
+    outside the session must ``db.session.refresh()`` them explicitly.
+    """
+    connection = database.engine.connect()
+    transaction = connection.begin()
+    session = scoped_session(
+        sessionmaker(bind=connection, query_cls=database.Query, expire_on_commit=False)
+    )
+    session.begin_nested()
+
+    @event.listens_for(session(), "after_transaction_end")
+    def restart_savepoint(sess, trans):
+        if trans.nested and not trans._parent.nested:
+            sess.begin_nested()
+
+    old_session = database.session
+    database.session = session
+
+    yield database
+
+    database.session = old_session
+    session.remove()
+    transaction.rollback()
+    connection.close()
 
 
 @pytest.yield_fixture()
@@ -147,9 +203,12 @@ def dummy_location(db):
     """File system location."""
     tmppath = tempfile.mkdtemp()
 
+    # Created per test inside its SAVEPOINT rather than once per session: a
+    # committed row would show up in tests asserting on the exact set of
+    # locations (e.g. test_location).
     loc = Location(name="testloc", uri=tmppath, default=True)
     db.session.add(loc)
-    db.session.commit()
+    db.session.flush()
 
     yield loc
 
@@ -175,7 +234,7 @@ def extra_location(db):
 
     loc = Location(name="extra", uri=tmppath, default=False)
     db.session.add(loc)
-    db.session.commit()
+    db.session.flush()
 
     yield loc
 
@@ -190,6 +249,15 @@ def bucket(db, dummy_location):
     return b1
 
 
+@pytest.fixture()
+def readable_src(db, dummy_location):
+    """File instance with contents, usable as a copy source."""
+    src = FileInstance.create()
+    src.set_contents(BytesIO(b"this is some data"), default_location=dummy_location.uri)
+    db.session.flush()
+    return src
+
+
 @pytest.fixture()
 def multipart(db, bucket):
     """Multipart object."""
@@ -404,6 +472,26 @@ def get_json():
     return inner
 
 
+@pytest.fixture()
+def count_queries(db):
+    """Collect the SQL statements executed within a block."""
+
+    @contextmanager
+    def inner():
+        queries = []
+
+        def before_cursor_execute(conn, cursor, statement, *args):
+            queries.append(statement)
+
+        event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            yield queries
+        finally:
+            event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+
+    return inner
+
+
 @pytest.fixture()
 def offload_file_serving(app):
     """Serve a redirect instead of streaming the file."""
@@ -8,14 +8,17 @@
 
 """Module test views."""
 
+import itertools
 import sys
 import uuid
 from io import BytesIO
-from os.path import getsize
+from unittest.mock import Mock, call
 
 import pytest
 from fs.errors import ResourceNotFound
+from sqlalchemy import bindparam, func, select
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import raiseload, selectinload
 
 from invenio_files_rest.errors import (
     BucketLockedError,
@@ -34,19 +37,43 @@ from invenio_files_rest.models import (
 )
 
 
-def b(s):
-    return s.encode("latin-1")
+def _read(path):
+    with open(path, "rb") as fp:
+        return fp.read()
+
+
+_LICENSE_BYTES = _read("LICENSE")
+_LICENSE_SIZE = len(_LICENSE_BYTES)
+_README_BYTES = _read("README.rst")
+_README_SIZE = len(_README_BYTES)
+
+_uid_counter = itertools.count(1)
+
+# Selecting from the mapped classes (not their tables) keeps autoflush.
+_OV_COUNT = select(func.count()).select_from(ObjectVersion)
+_FI_COUNT = select(func.count()).select_from(FileInstance)
+_OV_COUNT_BY_FILE = _OV_COUNT.where(ObjectVersion.file_id == bindparam("fid"))
+
+
+def _uid():
+    """Deterministic UUID for tests where the identity does not matter."""
+    return uuid.UUID(int=next(_uid_counter))
+
+
+def _count(db, stmt, **params):
+    return db.session.execute(stmt, params).scalar()
 
 
 def test_location(app, db):
     """Test location model."""
     with db.session.begin_nested():
-        l1 = Location(name="test1", uri="file:///tmp", default=False)
-        l2 = Location(name="test2", uri="file:///tmp", default=True)
-        l3 = Location(name="test3", uri="file:///tmp", default=False)
-        db.session.add(l1)
-        db.session.add(l2)
-        db.session.add(l3)
+        db.session.bulk_save_objects(
+            [
+                Location(name="test1", uri="file:///tmp", default=False),
+                Location(name="test2", uri="file:///tmp", default=True),
+                Location(name="test3", uri="file:///tmp", default=False),
+            ]
+        )
 
     assert Location.get_by_name("test1").name == "test1"
     assert Location.get_by_name("test2").name == "test2"
@@ -100,15 +127,15 @@ def test_location_validation(app, db):
 def test_bucket_removal(app, db, bucket, objects):
     """Test removal of bucket."""
     assert Bucket.query.count() == 1
-    assert ObjectVersion.query.count() == 4
-    assert FileInstance.query.count() == 4
+    assert _count(db, _OV_COUNT) == 4
+    assert _count(db, _FI_COUNT) == 4
     bucket.locked = True
     pytest.raises(BucketLockedError, bucket.remove)
     bucket.locked = False
     bucket.remove()
     assert Bucket.query.count() == 0
-    assert ObjectVersion.query.count() == 0
-    assert FileInstance.query.count() == 4
+    assert _count(db, _OV_COUNT) == 0
+    assert _count(db, _FI_COUNT) == 4
 
 
 def test_bucket_kwargs_creation(app, db, dummy_location):
@@ -121,24 +148,40 @@ def test_bucket_kwargs_creation(app, db, dummy_location):
 def test_bucket_create_object(app, db):
     """Test bucket creation."""
     with db.session.begin_nested():
-        l1 = Location(name="test1", uri="file:///tmp/1", default=False)
-        l2 = Location(name="test2", uri="file:///tmp/2", default=True)
-        db.session.add(l1)
-        db.session.add(l2)
+        db.session.bulk_save_objects(
+            [
+                Location(name="test1", uri="file:///tmp/1", default=False),
+                Location(name="test2", uri="file:///tmp/2", default=True),
+            ]
+        )
 
     assert Location.query.count() == 2
+    # Bulk saved objects are not added to the session, so load them back.
+    l1 = Location.get_by_name("test1")
+    l2 = Location.get_by_name("test2")
+    default_loc = Location.get_default()
 
     # Simple create
     with db.session.begin_nested():
         b = Bucket.create()
         assert b.id
-        assert b.default_location == Location.get_default().id
-        assert b.location == Location.get_default()
-        assert b.default_storage_class == app.config["FILES_REST_DEFAULT_STORAGE_CLASS"]
-        assert b.size == 0
-        assert b.quota_size is None
-        assert b.max_file_size is None
-        assert b.deleted is False
+        assert (
+            b.default_location,
+            b.location,
+            b.default_storage_class,
+            b.size,
+            b.quota_size,
+            b.max_file_size,
+            b.deleted,
+        ) == (
+            default_loc.id,
+            default_loc,
+            app.config["FILES_REST_DEFAULT_STORAGE_CLASS"],
+            0,
+            None,
+            None,
+            False,
+        )
 
     # __repr__ test
     assert str(b) == str(b.id)
@@ -149,12 +192,12 @@ def test_bucket_create_object(app, db):
     # Create with location_name and storage class
     with db.session.begin_nested():
         b = Bucket.create(location=l1, storage_class="A")
-        assert b.default_location == Location.get_by_name("test1").id
+        assert b.default_location == l1.id
         assert b.default_storage_class == "A"
 
         # Create using location name instead
         b = Bucket.create(location=l2.name, storage_class="A")
-        assert b.default_location == Location.get_by_name("test2").id
+        assert b.default_location == l2.id
 
     # Retrieve one
     assert Bucket.all().count() == 3
@@ -185,24 +228,28 @@ def test_object_create(app, db, dummy_location):
         b = Bucket.create()
         # Create one object version
         obj1 = ObjectVersion.create(b, "test")
-        assert obj1.bucket_id == b.id
-        assert obj1.key == "test"
         assert obj1.version_id
-        assert obj1.file_id is None
-        assert obj1.is_head is True
-        assert obj1.bucket == b
+        assert (
+            obj1.bucket_id,
+            obj1.key,
+            obj1.file_id,
+            obj1.is_head,
+            obj1.bucket,
+        ) == (b.id, "test", None, True, b)
 
         # Set fake location.
         obj1.set_location("file:///tmp/obj1", 1, "checksum")
 
         # Create one object version for same object key
         obj2 = ObjectVersion.create(b, "test")
-        assert obj2.bucket_id == b.id
-        assert obj2.key == "test"
         assert obj2.version_id != obj1.version_id
-        assert obj2.file_id is None
-        assert obj2.is_head is True
-        assert obj2.bucket == b
+        assert (
+            obj2.bucket_id,
+            obj2.key,
+            obj2.file_id,
+            obj2.is_head,
+            obj2.bucket,
+        ) == (b.id, "test", None, True, b)
 
         # Set fake location
         obj2.set_location("file:///tmp/obj2", 2, "checksum")
@@ -227,7 +274,7 @@ def test_object_create(app, db, dummy_location):
         ).encode("utf-8")
 
     # Sanity check
-    assert ObjectVersion.query.count() == 4
+    assert _count(db, _OV_COUNT) == 4
 
     # Assert that obj2 is the head version
     obj = ObjectVersion.get(b.id, "test", version_id=obj1.version_id)
@@ -257,10 +304,10 @@ def test_object_create_uq_constraint(app, db, dummy_location):
 
     # Create 2 object version
     obj1 = ObjectVersion(
-        bucket=b, key="test", version_id=uuid.uuid4(), is_head=False, mimetype=None
+        bucket=b, key="test", version_id=_uid(), is_head=False, mimetype=None
     )
     obj2 = ObjectVersion(
-        bucket=b, key="test", version_id=uuid.uuid4(), is_head=True, mimetype=None
+        bucket=b, key="test", version_id=_uid(), is_head=True, mimetype=None
     )
     db.session.add(obj1)
     db.session.add(obj2)
@@ -268,7 +315,7 @@ def test_object_create_uq_constraint(app, db, dummy_location):
 
     # Create one invalid object version for same object key (is_head = True)
     obj3 = ObjectVersion(
-        bucket=b, key="test", version_id=uuid.uuid4(), is_head=True, mimetype=None
+        bucket=b, key="test", version_id=_uid(), is_head=True, mimetype=None
     )
     db.session.add(obj3)
     pytest.raises(IntegrityError, db.session.commit)
@@ -298,7 +345,7 @@ def test_object_multibucket(app, db, dummy_location):
         obj2.set_location("file:///tmp/obj2", 2, "checksum")
 
     # Sanity check
-    assert ObjectVersion.query.count() == 2
+    assert _count(db, _OV_COUNT) == 2
 
     # Assert object versions are correctly created in each bucket.
     obj = ObjectVersion.get(b1.id, "test")
@@ -309,7 +356,7 @@ def test_object_multibucket(app, db, dummy_location):
     assert obj.version_id == obj2.version_id
 
 
-def test_object_get_by_bucket(app, db, dummy_location):
+def test_object_get_by_bucket(app, db, dummy_location, count_queries):
     """Test object listing."""
     b1 = Bucket.create()
     b2 = Bucket.create()
@@ -326,10 +373,10 @@ def test_object_get_by_bucket(app, db, dummy_location):
     # Create objects in/not in same bucket using different key.
     ObjectVersion.create(b1, "another").set_location("b1another1", 1, "achecksum")
     ObjectVersion.create(b2, "test").set_location("b2test1", 1, "achecksum")
-    db.session.commit()
+    db.session.flush()
 
     # Sanity check
-    assert ObjectVersion.query.count() == 5
+    assert _count(db, _OV_COUNT) == 5
     assert ObjectVersion.get(b1, "test")
     assert ObjectVersion.get(b1, "another")
     assert ObjectVersion.get(b2, "test")
@@ -341,19 +388,31 @@ def test_object_get_by_bucket(app, db, dummy_location):
     assert ObjectVersion.get_by_bucket(b2, versions=True).count() == 1
 
     # Assert order of returned objects (alphabetical)
-    objs = ObjectVersion.get_by_bucket(b1.id).all()
-    assert objs[0].key == "another"
-    assert objs[1].key == "test"
+    with count_queries() as queries:
+        objs = (
+            ObjectVersion.get_by_bucket(b1.id)
+            .options(selectinload(ObjectVersion.file), raiseload("*"))
+            .all()
+        )
+        assert objs[0].key == "another"
+        assert objs[1].key == "test"
+    assert len(queries) <= 2
 
     # Assert order of returned objects verions (creation date ascending)
-    objs = ObjectVersion.get_by_bucket(b1.id, versions=True).all()
-    assert objs[0].key == "another"
-    assert objs[1].key == "test"
-    assert objs[1].version_id == obj1_latest.version_id
-    assert objs[2].key == "test"
-    assert objs[2].version_id == obj1_intermediate.version_id
-    assert objs[3].key == "test"
-    assert objs[3].version_id == obj1_first.version_id
+    with count_queries() as queries:
+        objs = (
+            ObjectVersion.get_by_bucket(b1.id, versions=True)
+            .options(selectinload(ObjectVersion.file), raiseload("*"))
+            .all()
+        )
+        assert objs[0].key == "another"
+        assert objs[1].key == "test"
+        assert objs[1].version_id == obj1_latest.version_id
+        assert objs[2].key == "test"
+        assert objs[2].version_id == obj1_intermediate.version_id
+        assert objs[3].key == "test"
+        assert objs[3].version_id == obj1_first.version_id
+    assert len(queries) <= 2
 
 
 def test_object_delete(app, db, dummy_location):
@@ -365,7 +424,7 @@ def test_object_delete(app, db, dummy_location):
         ObjectVersion.create(b1, "test").set_location("b1test2", 1, "achecksum")
         obj_deleted = ObjectVersion.delete(b1, "test")
 
-    assert ObjectVersion.query.count() == 3
+    assert _count(db, _OV_COUNT) == 3
     assert ObjectVersion.get(b1, "test") is None
     assert ObjectVersion.get_by_bucket(b1).count() == 0
 
@@ -375,7 +434,7 @@ def test_object_delete(app, db, dummy_location):
 
     ObjectVersion.create(b1, "test").set_location("b1test4", 1, "achecksum")
 
-    assert ObjectVersion.query.count() == 4
+    assert _count(db, _OV_COUNT) == 4
     assert ObjectVersion.get(b1.id, "test") is not None
     assert ObjectVersion.get_by_bucket(b1.id).count() == 1
 
@@ -386,61 +445,62 @@ def test_object_remove(app, db, bucket, objects):
     obj_size = obj.file.size
     before_size = bucket.size
 
-    assert ObjectVersion.query.count() == 4
+    assert _count(db, _OV_COUNT) == 4
     obj.remove()
-    assert ObjectVersion.query.count() == 3
+    assert _count(db, _OV_COUNT) == 3
     assert bucket.size == before_size - obj_size
 
     bucket.locked = True
     obj = objects[1]
     pytest.raises(BucketLockedError, obj.remove)
-    assert ObjectVersion.query.count() == 3
+    assert _count(db, _OV_COUNT) == 3
 
 
 def test_object_remove_marker(app, db, bucket, objects):
     """Test object remove."""
     obj = objects[0]
-    assert ObjectVersion.query.count() == 4
+    assert _count(db, _OV_COUNT) == 4
     obj = ObjectVersion.delete(obj.bucket, obj.key)
     db.session.commit()
-    assert ObjectVersion.query.count() == 5
+    assert _count(db, _OV_COUNT) == 5
     obj = ObjectVersion.get(obj.bucket, obj.key, version_id=obj.version_id)
     obj.remove()
-    assert ObjectVersion.query.count() == 4
+    assert _count(db, _OV_COUNT) == 4
 
 
 def test_object_set_contents(app, db, dummy_location):
     """Test object set contents."""
+    data = BytesIO(_LICENSE_BYTES)
     with db.session.begin_nested():
         b1 = Bucket.create()
         obj = ObjectVersion.create(b1, "LICENSE")
         assert obj.file_id is None
-        assert FileInstance.query.count() == 0
+        assert _count(db, _FI_COUNT) == 0
 
         # Save a file.
-        with open("LICENSE", "rb") as fp:
-            obj.set_contents(fp)
+        obj.set_contents(data)
 
     # Assert size, location and checksum
     assert obj.file_id is not None
     assert obj.file.uri is not None
-    assert obj.file.size == getsize("LICENSE")
+    assert obj.file.size == _LICENSE_SIZE
     assert obj.file.checksum is not None
     assert b1.size == obj.file.size
 
     # Try to overwrite
     with db.session.begin_nested():
-        with open("LICENSE", "rb") as fp:
-            pytest.raises(FileInstanceAlreadySetError, obj.set_contents, fp)
+        pytest.raises(
+            FileInstanceAlreadySetError, obj.set_contents, BytesIO(_LICENSE_BYTES)
+        )
 
     # Save a new version with different content
+    data = BytesIO(_README_BYTES)
     with db.session.begin_nested():
         obj2 = ObjectVersion.create(b1, "LICENSE")
-        with open("README.rst", "rb") as fp:
-            obj2.set_contents(fp)
+        obj2.set_contents(data)
 
     assert obj2.file_id is not None and obj2.file_id != obj.file_id
-    assert obj2.file.size == getsize("README.rst")
+    assert obj2.file.size == _README_SIZE
     assert obj2.file.uri != obj.file.uri
     assert Bucket.get(b1.id).size == obj.file.size + obj2.file.size
 
@@ -471,16 +531,16 @@ def test_object_set_location(app, db, dummy_location):
         b1 = Bucket.create()
         obj = ObjectVersion.create(b1, "LICENSE")
         assert obj.file_id is None
-        assert FileInstance.query.count() == 0
+        assert _count(db, _FI_COUNT) == 0
         obj.set_location("b1test1", 1, "achecksum")
-        assert FileInstance.query.count() == 1
+        assert _count(db, _FI_COUNT) == 1
         pytest.raises(
             FileInstanceAlreadySetError, obj.set_location, "b1test1", 1, "achecksum"
         )
 
 
-def test_object_snapshot(app, db, dummy_location):
-    """Test snapshot creation."""
+def _build_snapshot_graph(db):
+    """Create two buckets with versions, delete markers and restored keys."""
     b1 = Bucket.create()
     b2 = Bucket.create()
     ObjectVersion.create(b1, "versioned").set_location("b1v1", 1, "achecksum")
@@ -492,33 +552,57 @@ def test_object_snapshot(app, db, dummy_location):
     ObjectVersion.create(b1, "undeleted").set_location("b1u2", 1, "achecksum")
     ObjectVersion.create(b1, "simple").set_location("b1s1", 1, "achecksum")
     ObjectVersion.create(b2, "another").set_location("b2a1", 1, "achecksum")
-    db.session.commit()
+    db.session.flush()
+    return b1, b2
+
+
+@pytest.mark.parametrize("deleted", [False, True])
+def test_object_snapshot(app, db, dummy_location, count_queries, deleted):
+    """Test snapshot creation (and of a deleted bucket)."""
+    b1, b2 = _build_snapshot_graph(db)
+
+    if deleted:
+        b2.deleted = True
+        db.session.flush()
+
+        b3 = b1.snapshot()
+        assert b3.id != b1.id
+        assert b3.locked is False
+
+        # b2 is deleted.
+        with pytest.raises(InvalidOperationError) as excinfo:
+            b2.snapshot()
+        assert excinfo.value.get_body() != {}
+        return
 
-    assert ObjectVersion.query.count() == 9
-    assert FileInstance.query.count() == 7
+    assert _count(db, _OV_COUNT) == 9
+    assert _count(db, _FI_COUNT) == 7
     assert Bucket.query.count() == 2
     assert ObjectVersion.get_by_bucket(b1).count() == 3
     assert ObjectVersion.get_by_bucket(b2).count() == 1
 
     # check that for 'undeleted' key there is only one HEAD
-    heads = [
-        o
-        for o in ObjectVersion.query.filter_by(bucket_id=b1.id, key="undeleted").all()
-        if o.is_head
-    ]
-    assert len(heads) == 1
-    assert heads[0].file.uri == "b1u2"
+    versions = ObjectVersion.query.filter_by(bucket_id=b1.id, key="undeleted")
+    with count_queries() as queries:
+        heads = [
+            o
+            for o in versions.options(selectinload(ObjectVersion.file)).all()
+            if o.is_head
+        ]
+        assert len(heads) == 1
+        assert heads[0].file.uri == "b1u2"
+    assert len(queries) <= 2
 
     b3 = b1.snapshot(lock=True)
-    db.session.commit()
+    db.session.flush()
 
     # Must be locked as requested.
     assert b1.locked is False
     assert b3.locked is True
 
     assert Bucket.query.count() == 3
-    assert ObjectVersion.query.count() == 12
-    assert FileInstance.query.count() == 7
+    assert _count(db, _OV_COUNT) == 12
+    assert _count(db, _FI_COUNT) == 7
     assert ObjectVersion.get_by_bucket(b1).count() == 3
     assert ObjectVersion.get_by_bucket(b2).count() == 1
     assert ObjectVersion.get_by_bucket(b3).count() == 3
@@ -528,23 +612,6 @@ def test_object_snapshot(app, db, dummy_location):
     assert ObjectVersion.get_by_bucket(b3, versions=True).count() == 3
 
 
-def test_object_snapshot_deleted(app, db, dummy_location):
-    """Test snapshot creation of a deleted bucket."""
-    b1 = Bucket.create()
-    b2 = Bucket.create()
-    b2.deleted = True
-    db.session.commit()
-
-    b3 = b1.snapshot()
-    assert b3.id != b1.id
-    assert b3.locked is False
-
-    # b2 is deleted.
-    with pytest.raises(InvalidOperationError) as excinfo:
-        b2.snapshot()
-    assert excinfo.value.get_body() != {}
-
-
 def test_bucket_sync_new_object(app, db, dummy_location):
     """Test that a new file in src in synced to dest."""
     b1 = Bucket.create()
@@ -696,7 +763,7 @@ def test_object_copy(app, db, dummy_location):
     """Copy object."""
     f = FileInstance(uri="f1", size=1, checksum="mychecksum")
     db.session.add(f)
-    db.session.commit()
+    db.session.flush()
     b1 = Bucket.create()
     b2 = Bucket.create()
 
@@ -708,9 +775,9 @@ def test_object_copy(app, db, dummy_location):
 
     # Copy onto self.
     obj = ObjectVersion.create(b1, "selftest").set_file(f)
-    db.session.commit()
+    db.session.flush()
     obj_copy = obj.copy()
-    db.session.commit()
+    db.session.flush()
     assert obj_copy.version_id != obj.version_id
     assert obj_copy.key == obj.key
     assert obj_copy.bucket == obj.bucket
@@ -721,7 +788,7 @@ def test_object_copy(app, db, dummy_location):
 
     # Copy new key
     obj_copy2 = obj_copy.copy(key="newkeytest")
-    db.session.commit()
+    db.session.flush()
     assert obj_copy2.version_id != obj_copy.version_id
     assert obj_copy2.key == "newkeytest"
     assert obj_copy2.bucket == obj_copy.bucket
@@ -786,7 +853,7 @@ def test_object_set_file(app, db, dummy_location):
     b = Bucket.create()
     f = FileInstance(uri="f1", size=1, checksum="mychecksum")
     obj = ObjectVersion.create(b, "test").set_file(f)
-    db.session.commit()
+    db.session.flush()
     assert obj.file == f
 
     assert pytest.raises(FileInstanceAlreadySetError, obj.set_file, f)
@@ -795,7 +862,7 @@ def test_object_set_file(app, db, dummy_location):
 def test_object_mimetype(app, db, dummy_location):
     """Test object set file."""
     b = Bucket.create()
-    db.session.commit()
+    db.session.flush()
     obj1 = ObjectVersion.create(b, "test.pdf", stream=BytesIO(b"pdfdata"))
     obj2 = ObjectVersion.create(b, "README", stream=BytesIO(b"pdfdata"))
     obj3 = ObjectVersion.create(b, "test.csv.gz", stream=BytesIO(b"gzdata"))
@@ -806,7 +873,7 @@ def test_object_mimetype(app, db, dummy_location):
 
     # Override computed MIME type.
     obj2.mimetype = "text/plain"
-    db.session.commit()
+    db.session.flush()
     assert ObjectVersion.get(b, "README").mimetype == "text/plain"
 
 
@@ -821,9 +888,9 @@ def test_object_restore(app, db, dummy_location):
     obj1 = ObjectVersion.create(b1, "test").set_file(f1)
     ObjectVersion.create(b1, "test").set_file(f2)
     obj_deleted = ObjectVersion.delete(b1, "test")
-    db.session.commit()
+    db.session.flush()
 
-    assert ObjectVersion.query.count() == 3
+    assert _count(db, _OV_COUNT) == 3
     # Cannot restore a deleted version.
     with pytest.raises(InvalidOperationError) as excinfo:
         obj_deleted.restore()
@@ -831,9 +898,9 @@ def test_object_restore(app, db, dummy_location):
 
     # Restore first version
     obj_new = obj1.restore()
-    db.session.commit()
+    db.session.flush()
 
-    assert ObjectVersion.query.count() == 4
+    assert _count(db, _OV_COUNT) == 4
     assert obj_new.is_head is True
     assert obj_new.version_id != obj1.version_id
     assert obj_new.key == obj1.key
@@ -841,38 +908,43 @@ def test_object_restore(app, db, dummy_location):
     assert obj_new.bucket == obj1.bucket
 
 
-def test_object_relink_all(app, db, dummy_location):
+def test_object_relink_all(app, db, dummy_location, count_queries):
     """Test relinking files."""
     b1 = Bucket.create()
-    obj1 = ObjectVersion.create(b1, "relink-test", stream=BytesIO(b("relinkthis")))
-    ObjectVersion.create(b1, "do-not-touch", stream=BytesIO(b("na")))
+    obj1 = ObjectVersion.create(b1, "relink-test", stream=BytesIO(b"relinkthis"))
+    ObjectVersion.create(b1, "do-not-touch", stream=BytesIO(b"na"))
     b1.snapshot()
-    db.session.commit()
+    db.session.flush()
 
-    assert ObjectVersion.query.count() == 4
-    assert FileInstance.query.count() == 2
+    assert _count(db, _OV_COUNT) == 4
+    assert _count(db, _FI_COUNT) == 2
 
     fnew = FileInstance.create()
     fnew.copy_contents(obj1.file, default_location=b1.location.uri)
-    db.session.commit()
+    db.session.flush()
 
     fold = obj1.file
 
-    assert ObjectVersion.query.filter_by(file_id=fold.id).count() == 2
-    assert ObjectVersion.query.filter_by(file_id=fnew.id).count() == 0
+    assert _count(db, _OV_COUNT_BY_FILE, fid=fold.id) == 2
+    assert _count(db, _OV_COUNT_BY_FILE, fid=fnew.id) == 0
 
-    ObjectVersion.relink_all(obj1.file, fnew)
-    db.session.commit()
+    with count_queries() as queries:
+        ObjectVersion.relink_all(fold, fnew)
+    # SAVEPOINT, a single UPDATE and RELEASE, whatever the number of objects.
+    assert len(queries) <= 3
+    db.session.flush()
 
-    assert ObjectVersion.query.filter_by(file_id=fold.id).count() == 0
-    assert ObjectVersion.query.filter_by(file_id=fnew.id).count() == 2
+    assert _count(db, _OV_COUNT_BY_FILE, fid=fold.id) == 0
+    assert _count(db, _OV_COUNT_BY_FILE, fid=fnew.id) == 2
 
 
-def test_object_validation(app, db, dummy_location):
+@pytest.mark.parametrize("key, valid", [("x" * 255, True), ("x" * 256, False)])
+def test_object_validation(app, db, bucket, key, valid):
     """Test validating the ObjectVersion."""
-    b1 = Bucket.create()
-    ObjectVersion.create(b1, "x" * 255)  # Should not raise
-    pytest.raises(InvalidKeyError, ObjectVersion.create, b1, "x" * 256)
+    if valid:
+        ObjectVersion.create(bucket, key)  # Should not raise
+    else:
+        pytest.raises(InvalidKeyError, ObjectVersion.create, bucket, key)
 
 
 def test_bucket_tags(app, db, dummy_location):
@@ -880,10 +952,10 @@ def test_bucket_tags(app, db, dummy_location):
     b = Bucket.create()
     BucketTag.create(b, "mykey", "testvalue")
     BucketTag.create(b, "another_key", "another value")
-    db.session.commit()
+    db.session.flush()
 
     # Duplicate key
-    pytest.raises(Exception, BucketTag.create, b, "mykey", "newvalue")
+    pytest.raises(IntegrityError, BucketTag.create, b, "mykey", "newvalue")
 
     # Test get
     assert BucketTag.query.count() == 2
@@ -900,7 +972,7 @@ def test_bucket_tags(app, db, dummy_location):
     # Create or update
     BucketTag.create_or_update(b, "another_key", "newval")
     BucketTag.create_or_update(b, "newkey", "testval")
-    db.session.commit()
+    db.session.flush()
     assert BucketTag.get_value(b, "another_key") == "newval"
     assert BucketTag.get_value(b, "newkey") == "testval"
 
@@ -912,25 +984,25 @@ def test_bucket_tags(app, db, dummy_location):
 
     # Test cascading delete.
     Bucket.query.delete()
-    db.session.commit()
+    db.session.flush()
     assert BucketTag.query.count() == 0
 
 
 def test_fileinstance_get(app, db, dummy_location):
     """Test fileinstance get."""
     f = FileInstance.create()
-    db.session.commit()
+    db.session.flush()
     # Get existing file.
     assert FileInstance.get(f.id) is not None
     # Non-existing files returns none
-    assert FileInstance.get(uuid.uuid4()) is None
+    assert FileInstance.get(_uid()) is None
 
 
 def test_fileinstance_get_by_uri(app, db, dummy_location):
     """Test file get by uri."""
     f = FileInstance.create()
     f.uri = "LICENSE"
-    db.session.commit()
+    db.session.flush()
 
     assert FileInstance.get_by_uri("LICENSE") is not None
     FileInstance.get_by_uri("NOTVALID") is None
@@ -941,106 +1013,87 @@ def test_fileinstance_create(app, db, dummy_location):
     """Test file instance create."""
     f = FileInstance.create()
     assert f.id
-    assert f.readable is False
-    assert f.writable is True
-    assert f.uri is None
-    assert f.size == 0
-    assert f.checksum is None
-    assert f.last_check_at is None
-    assert f.last_check is None
-    db.session.commit()
+    assert (
+        f.readable,
+        f.writable,
+        f.uri,
+        f.size,
+        f.checksum,
+        f.last_check_at,
+        f.last_check,
+    ) == (False, True, None, 0, None, None, None)
+    db.session.flush()
 
     # Check unique constraint on URI with none values.
     f = FileInstance.create()
     f = FileInstance.create()
-    db.session.commit()
+    db.session.flush()
 
 
 def test_fileinstance_set_contents(app, db, dummy_location):
     """Test file instance create."""
-    counter = dict(called=False)
-
-    def callback(total, size):
-        counter["called"] = True
+    callback = Mock()
 
     f = FileInstance.create()
-    db.session.commit()
+    db.session.flush()
     assert f.readable is False
     assert f.writable is True
-    data = BytesIO(b("test file instance set contents"))
+    data = BytesIO(b"test file instance set contents")
     f.set_contents(
         data, default_location=dummy_location.uri, progress_callback=callback
     )
-    db.session.commit()
+    db.session.flush()
     assert f.readable is True
     assert f.writable is False
-    assert counter["called"]
+    # The payload fits in one chunk: one progress call plus the final one.
+    assert callback.call_count <= 2
+    assert callback.call_args == call(f.size, f.size)
 
     pytest.raises(
         ValueError,
         f.set_contents,
-        BytesIO(b("different content")),
+        BytesIO(b"different content"),
         location=dummy_location,
     )
 
 
-def test_fileinstance_copy_contents(app, db, dummy_location):
+def test_fileinstance_copy_contents(app, db, dummy_location, readable_src):
     """Test copy contents."""
-    counter = dict(called=False)
-
-    def callback(total, size):
-        counter["called"] = True
-
-    # Create source and set data.
-    data = b("this is some data")
-    src = FileInstance.create()
-    src.set_contents(BytesIO(data), default_location=dummy_location.uri)
-    db.session.commit()
+    callback = Mock()
 
-    # Create destination - and use it to copy_contents from another object.
+    # Source not readable
     dst = FileInstance.create()
     assert dst.size == 0
     assert dst.uri is None
-    db.session.commit()
+    pytest.raises(ValueError, dst.copy_contents, FileInstance.create())
+
+    # Destination not writable
+    dst.writable = False
+    pytest.raises(ValueError, dst.copy_contents, readable_src)
+    # Size is not 0
+    dst.writable = True
+    dst.size = 1
+    pytest.raises(ValueError, dst.copy_contents, readable_src)
+    dst.size = 0
+    db.session.flush()
 
     # Copy contents
     dst.copy_contents(
-        src, progress_callback=callback, default_location=dummy_location.uri
+        readable_src, progress_callback=callback, default_location=dummy_location.uri
     )
-    db.session.commit()
-    assert dst.size == src.size
-    assert dst.checksum == src.checksum
-    assert dst.uri != src.uri
-    assert counter["called"]
+    db.session.flush()
+    assert dst.size == readable_src.size
+    assert dst.checksum == readable_src.checksum
+    assert dst.uri != readable_src.uri
+    assert callback.call_count <= 2
+    assert callback.call_args == call(dst.size, dst.size)
 
     # Read data
     fp = dst.storage().open()
-    assert data == fp.read()
+    assert b"this is some data" == fp.read()
     fp.close()
 
 
-def test_fileinstance_copy_contents_invalid(app, db, dummy_location):
-    """Test invalid copy contents."""
-    # Source not readable
-    src = FileInstance.create()
-    dst = FileInstance.create()
-    pytest.raises(ValueError, dst.copy_contents, src)
-
-    # Create valid source
-    data = b("this is some data")
-    src = FileInstance.create()
-    src.set_contents(BytesIO(data), default_location=dummy_location.uri)
-    db.session.commit()
-
-    # Destination not writable
-    dst.writable = False
-    pytest.raises(ValueError, dst.copy_contents, src)
-    # Size is not 0
-    dst.writable = True
-    dst.size = 1
-    pytest.raises(ValueError, dst.copy_contents, src)
-
-
 def test_fileinstance_send_file(app, db, dummy_location):
     """Test file instance send file."""
     f = FileInstance.create()
@@ -1048,9 +1101,9 @@ def test_fileinstance_send_file(app, db, dummy_location):
     pytest.raises(FileInstanceUnreadableError, f.send_file)
 
     # Write data
-    data = b("test file instance set contents")
+    data = b"test file instance set contents"
     f.set_contents(BytesIO(data), default_location=dummy_location.uri)
-    db.session.commit()
+    db.session.flush()
 
     # Send data
     with app.test_request_context():
@@ -1058,11 +1111,14 @@ def test_fileinstance_send_file(app, db, dummy_location):
         assert int(res.headers["Content-Length"]) == len(data)
 
 
-def test_fileinstance_validation(app, db, dummy_location):
+@pytest.mark.parametrize("uri, valid", [("x" * 255, True), ("x" * 256, False)])
+def test_fileinstance_validation(app, db, dummy_location, uri, valid):
     """Test validating the FileInstance."""
     f = FileInstance.create()
-    f.set_uri("x" * 255, 1000, 1000)  # Should not raise
-    pytest.raises(ValueError, f.set_uri, "x" * 256, 1000, 1000)
+    if valid:
+        f.set_uri(uri, 1000, 1000)  # Should not raise
+    else:
+        pytest.raises(ValueError, f.set_uri, uri, 1000, 1000)
 
 
 def test_object_version_tags(app, db, dummy_location):
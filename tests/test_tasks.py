@@ -131,6 +131,7 @@ def test_migrate_file(app, db, dummy_location, extra_location, bucket, objects):
 
     # Get object again
     obj = ObjectVersion.get(bucket, obj.key)
+    db.session.refresh(obj)
     new_uri = obj.file.uri
     assert exists(old_uri)
     assert exists(new_uri)
@@ -198,6 +199,7 @@ def test_clear_orphaned_files(app, db, dummy_location, versions):
 
     file_.writable = False
     db.session.commit()
+    db.session.refresh(file_)
 
     # make sure that the file is orphaned
     assert not file_.objects
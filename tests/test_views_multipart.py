@@ -662,15 +662,22 @@ def test_already_exhausted_input_stream(app, client, db, bucket, admin_user):
 
         request.data
 
-    app.before_request(consume_request_input_stream)
-    login_user(client, admin_user)
-    resp = client.put(
-        object_url,
-        input_stream=BytesIO(data),
-    )
-    assert resp.status_code == 500
-    resp = client.post(
-        object_url,
-        input_stream=BytesIO(data),
-    )
-    assert resp.status_code == 500
+    # The application is shared by the whole module, so the hook is installed
+    # directly (``app.before_request`` is refused once requests have been
+    # served) and removed again afterwards.
+    hooks = app.before_request_funcs.setdefault(None, [])
+    hooks.append(consume_request_input_stream)
+    try:
+        login_user(client, admin_user)
+        resp = client.put(
+            object_url,
+            input_stream=BytesIO(data),
+        )
+        assert resp.status_code == 500
+        resp = client.post(
+            object_url,
+            input_stream=BytesIO(data),
+        )
+        assert resp.status_code == 500
+    finally:
+        hooks.remove(consume_request_input_stream)